@@ -1,160 +1,326 @@
 #!/usr/bin/env python3
 """XLSX Export MCP Server - Python implementation."""
 
-import json
+import asyncio
+import contextlib
+import functools
+import string
 import sys
 import uuid
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from mcp.server.fastmcp import FastMCP
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
-import io
 
 # Export directory configuration
 EXPORT_DIR = "/tmp/protex-intelligence-file-exports"
 
+# Maps every unsafe ASCII character to "_" for filename sanitization
+_SAFE_FILENAME_CHARS = set(string.ascii_letters + string.digits + "_-")
+_FILENAME_TRANSLATION = str.maketrans(
+    {c: "_" for c in map(chr, range(128)) if c not in _SAFE_FILENAME_CHARS}
+)
 
-def add_watermark_to_sheet(ws, data_length: int):
-    """Add watermark to a worksheet."""
-    # Add watermark in first column
-    data_end_row = data_length + 1  # +1 for header row
-    watermark_row = data_end_row + 2  # Add some space after data
-    watermark_col = 1  # First column
+# Set once the export directory has been created for this process
+_EXPORT_DIR_READY = False
+
+# Watermark text, shared by every sheet
+WATERMARK_TEXT = "This content has been generated using Protex Intelligence. The output is intended to assist but may not always be accurate or complete. Please verify important information before acting upon it."
+
+
+@functools.cache
+def _openpyxl() -> SimpleNamespace:
+    """Import openpyxl on first use so server start-up does not pay for it."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    
+    return SimpleNamespace(
+        Workbook=Workbook,
+        WriteOnlyCell=WriteOnlyCell,
+        # Watermark style, built once and shared by every sheet
+        watermark_font=Font(name='Arial', size=8, color='666666'),
+        watermark_alignment=Alignment(horizontal='left'),
+    )
+
+
+def add_watermark_to_sheet(ws):
+    """Add watermark to a write-only worksheet, below the rows appended so far."""
+    # Leave a blank row after the data
+    ws.append([])
+    
+    openpyxl = _openpyxl()
     
     # Create watermark cell
-    watermark_cell = ws.cell(row=watermark_row, column=watermark_col, value="This content has been generated using Protex Intelligence. The output is intended to assist but may not always be accurate or complete. Please verify important information before acting upon it.")
+    watermark_cell = openpyxl.WriteOnlyCell(ws, value=WATERMARK_TEXT)
     
     # Style the watermark
-    watermark_cell.font = Font(name='Arial', size=8, color='666666')
-    watermark_cell.alignment = Alignment(horizontal='left')
+    watermark_cell.font = openpyxl.watermark_font
+    watermark_cell.alignment = openpyxl.watermark_alignment
+    
+    # Watermark goes in the first column
+    ws.append([watermark_cell])
 
 
-def convert_to_xlsx(
-    data: List[Dict[str, Any]], 
-    sheet_name: str = "Sheet1",
+def _get_field_names(
+    data: List[Dict[str, Any]],
     headers: Optional[List[str]] = None
-) -> bytes:
-    """Convert array of objects to XLSX bytes."""
-    if not data:
-        return b""
+) -> List[str]:
+    """Return the provided headers, or every key across all rows in first-seen order."""
+    if headers:
+        return headers
+    return list(dict.fromkeys(key for row_data in data for key in row_data))
+
+
+def _iter_row_values(data: List[Dict[str, Any]], field_names: List[str]):
+    """Yield each row's values in field_names order, using "" for missing keys."""
+    if not field_names:
+        for _ in data:
+            yield ()
+        return
     
-    # Create workbook and worksheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_name
+    # Gather all columns of a row in one C-level call
+    getter = itemgetter(*field_names)
+    single_column = len(field_names) == 1
+    # Sparse rows are normalised by merging them over these defaults
+    defaults = dict.fromkeys(field_names, "")
     
-    # Get headers from first object or use provided headers
-    if headers:
+    for row_data in data:
+        try:
+            values = getter(row_data)
+        except KeyError:
+            values = getter(defaults | row_data)
+        yield (values,) if single_column else values
+
+
+def _unwritable_row_error(ws, row_number: int, values) -> ValueError:
+    """Describe a row that openpyxl refused to append, naming the bad value."""
+    # Write-only append raises a bare ValueError; a standalone cell says why
+    for value in values:
+        try:
+            _openpyxl().WriteOnlyCell(ws, value=value)
+        except ValueError as e:
+            return ValueError(f"Sheet '{ws.title}', row {row_number}: {e}")
+    return ValueError(f"Sheet '{ws.title}', row {row_number} could not be written")
+
+
+def _discard_workbook(wb, filepath: Path) -> None:
+    """Delete the temp files behind a failed write-only workbook and any partial output."""
+    filepath.unlink(missing_ok=True)
+    
+    for ws in wb.worksheets:
+        writer = getattr(ws, "_writer", None)
+        if writer is None:
+            continue
+        # Already in an error path, so cleanup problems must not mask it.
+        # Finish the sheet's row generator first, or it will try to write
+        # to the closed file when it is garbage-collected.
+        rows = getattr(ws, "_rows", None)
+        if rows is not None:
+            with contextlib.suppress(Exception):
+                rows.close()
+        with contextlib.suppress(Exception):
+            writer.close()
+        with contextlib.suppress(Exception):
+            writer.cleanup()
+
+
+def rows_are_positional(
+    data: List[Union[Dict[str, Any], List[Any]]],
+    headers: Optional[List[str]] = None
+) -> bool:
+    """Return True for rows given as arrays, False for rows given as objects.
+    
+    Raises ValueError unless rows are all objects, or all arrays with one
+    value per header.
+    """
+    if all(isinstance(row, dict) for row in data):
+        return False
+    
+    if not all(isinstance(row, (list, tuple)) for row in data):
+        raise ValueError("Rows must be either all objects or all arrays")
+    
+    if not headers:
+        raise ValueError("Headers must be provided when rows are arrays")
+    
+    for row_number, row in enumerate(data, 1):
+        if len(row) != len(headers):
+            raise ValueError(
+                f"Row {row_number} has {len(row)} values but {len(headers)} headers were provided"
+            )
+    
+    return True
+
+
+def write_sheet(
+    wb,
+    sheet_name: str,
+    data: List[Union[Dict[str, Any], List[Any]]],
+    headers: Optional[List[str]] = None,
+    positional: bool = False
+) -> List[str]:
+    """Append a watermarked worksheet to a write-only workbook and return its columns.
+    
+    positional marks data as arrays already checked by rows_are_positional.
+    """
+    ws = wb.create_sheet(title=sheet_name)
+    
+    if positional:
+        # Rows are already positional, write them as they are
         field_names = headers
+        rows = data
     else:
-        field_names = list(data[0].keys())
-    
-    # Write headers
-    for col_idx, header in enumerate(field_names, 1):
-        ws.cell(row=1, column=col_idx, value=header)
+        # Get headers from all objects or use provided headers
+        field_names = _get_field_names(data, headers)
+        rows = _iter_row_values(data, field_names)
     
-    # Write data rows
-    for row_idx, row_data in enumerate(data, 2):
-        for col_idx, field_name in enumerate(field_names, 1):
-            value = row_data.get(field_name, "")
-            ws.cell(row=row_idx, column=col_idx, value=value)
+    # Write headers and data rows a whole row at a time
+    for row_number, values in enumerate(chain([field_names], rows), 1):
+        try:
+            ws.append(values)
+        except ValueError:
+            raise _unwritable_row_error(ws, row_number, values) from None
     
     # Add watermark
-    add_watermark_to_sheet(ws, len(data))
+    add_watermark_to_sheet(ws)
     
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+    return field_names
 
 
-def convert_multi_sheets_to_xlsx(sheets_data: List[Dict[str, Any]]) -> bytes:
-    """Convert multiple sheets data to XLSX bytes."""
-    if not sheets_data:
-        return b""
+def convert_to_xlsx(
+    filepath: Path,
+    data: List[Union[Dict[str, Any], List[Any]]], 
+    sheet_name: str = "Sheet1",
+    headers: Optional[List[str]] = None,
+    positional: Optional[bool] = None
+) -> List[str]:
+    """Convert array of rows to an XLSX file at filepath and return its columns.
     
-    # Create workbook
-    wb = Workbook()
+    positional is rows_are_positional(data, headers), computed here when omitted.
+    """
+    if not data:
+        return []
     
-    # Remove default sheet
-    wb.remove(wb.active)
+    if positional is None:
+        positional = rows_are_positional(data, headers)
     
-    for sheet_info in sheets_data:
-        sheet_name = sheet_info.get('sheet_name', 'Sheet1')
-        data = sheet_info.get('data', [])
-        headers = sheet_info.get('headers')
+    # Create write-only workbook so rows are streamed
+    wb = _openpyxl().Workbook(write_only=True)
+    try:
+        field_names = write_sheet(wb, sheet_name, data, headers, positional)
         
-        if not data:
-            continue
+        # Save straight to disk
+        wb.save(filepath)
+    except Exception:
+        _discard_workbook(wb, filepath)
+        raise
+    return field_names
+
+
+def convert_multi_sheets_to_xlsx(
+    filepath: Path,
+    sheets_data: List[Dict[str, Any]],
+    positional_flags: Optional[List[bool]] = None
+) -> None:
+    """Convert multiple sheets data to an XLSX file at filepath.
+    
+    positional_flags holds rows_are_positional() for each sheet, in order,
+    and is computed here when omitted.
+    """
+    if not sheets_data:
+        return
+    
+    if positional_flags is None:
+        positional_flags = [
+            rows_are_positional(sheet_info.get('data', []), sheet_info.get('headers'))
+            for sheet_info in sheets_data
+        ]
+    
+    # Create write-only workbook (starts without a default sheet)
+    wb = _openpyxl().Workbook(write_only=True)
+    
+    try:
+        for sheet_info, positional in zip(sheets_data, positional_flags):
+            sheet_name = sheet_info.get('sheet_name', 'Sheet1')
+            data = sheet_info.get('data', [])
+            headers = sheet_info.get('headers')
             
-        # Create new worksheet
-        ws = wb.create_sheet(title=sheet_name)
-        
-        # Get headers from first object or use provided headers
-        if headers:
-            field_names = headers
-        else:
-            field_names = list(data[0].keys())
-        
-        # Write headers
-        for col_idx, header in enumerate(field_names, 1):
-            ws.cell(row=1, column=col_idx, value=header)
-        
-        # Write data rows
-        for row_idx, row_data in enumerate(data, 2):
-            for col_idx, field_name in enumerate(field_names, 1):
-                value = row_data.get(field_name, "")
-                ws.cell(row=row_idx, column=col_idx, value=value)
+            if not data:
+                continue
+            
+            write_sheet(wb, sheet_name, data, headers, positional)
         
-        # Add watermark to this sheet
-        add_watermark_to_sheet(ws, len(data))
-    
-    # Save to bytes
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+        # Save straight to disk
+        wb.save(filepath)
+    except Exception:
+        _discard_workbook(wb, filepath)
+        raise
 
 
-def get_file_size_string(content: bytes) -> str:
-    """Calculate file size string from bytes content."""
-    bytes_size = len(content)
-    kb = bytes_size / 1024
-    
-    if kb < 1024:
-        return f"{kb:.0f} KB" if kb >= 1 else "1 KB"
+def get_file_size_string(bytes_size: int) -> str:
+    """Calculate file size string from a size in bytes."""
+    if bytes_size < 1024 * 1024:
+        # Round to the nearest KB in integer arithmetic, never below 1 KB
+        return f"{max(1, (bytes_size + 512) // 1024)} KB"
+    return f"{bytes_size / (1024 * 1024):.2f} MB"
+
+
+def generate_export_filename(filename: str) -> str:
+    """Build a sanitized, UUID-suffixed XLSX filename."""
+    file_uuid = str(uuid.uuid4())
+    if filename.isascii():
+        sanitized_filename = filename.translate(_FILENAME_TRANSLATION)
     else:
-        return f"{kb / 1024:.2f} MB"
+        # Keep non-ASCII letters and digits, as str.isalnum() allows them
+        sanitized_filename = "".join(c if c.isalnum() or c in "_-" else "_" for c in filename)
+    return f"{sanitized_filename}_{file_uuid}.xlsx"
 
 
 async def ensure_export_directory() -> None:
     """Ensure export directory exists, create if it doesn't."""
-    export_path = Path(EXPORT_DIR)
+    global _EXPORT_DIR_READY
     
-    if export_path.exists():
-        print(f"✓ Export directory exists: {EXPORT_DIR}", file=sys.stderr)
-    else:
-        try:
-            export_path.mkdir(parents=True, exist_ok=True)
-            print(f"✓ Created export directory: {EXPORT_DIR}", file=sys.stderr)
-        except Exception as e:
-            print(f"✗ Failed to create export directory: {e}", file=sys.stderr)
-            raise
+    if _EXPORT_DIR_READY:
+        return
+    
+    try:
+        Path(EXPORT_DIR).mkdir(parents=True, exist_ok=True)
+        print(f"✓ Export directory ready: {EXPORT_DIR}", file=sys.stderr)
+    except Exception as e:
+        print(f"✗ Failed to create export directory: {e}", file=sys.stderr)
+        raise
+    
+    _EXPORT_DIR_READY = True
 
 
-async def write_xlsx_to_file(xlsx_content: bytes, filename: str) -> str:
-    """Write XLSX content to file system."""
+async def export_to_file(filename: str, convert, *args) -> Tuple[Path, Any]:
+    """Run an XLSX converter that saves directly into the export directory.
+    
+    Returns the written path together with whatever the converter returned.
+    """
+    global _EXPORT_DIR_READY
+    
     await ensure_export_directory()
     
     filepath = Path(EXPORT_DIR) / filename
     
     try:
-        filepath.write_bytes(xlsx_content)
-        print(f"✓ File written: {filepath}", file=sys.stderr)
-        return str(filepath)
+        # Build and save the workbook off the event loop
+        try:
+            result = await asyncio.to_thread(convert, filepath, *args)
+        except FileNotFoundError:
+            if filepath.parent.exists():
+                raise
+            # Export directory was removed (e.g. by a tmp cleaner); recreate and retry once
+            _EXPORT_DIR_READY = False
+            await ensure_export_directory()
+            result = await asyncio.to_thread(convert, filepath, *args)
+        return filepath, result
     except Exception as e:
-        print(f"✗ Failed to write file: {e}", file=sys.stderr)
+        print(f"✗ Failed to generate or write file: {e}", file=sys.stderr)
         raise
 
 
@@ -164,7 +330,7 @@ mcp = FastMCP("xlsx-export-mcp")
 
 @mcp.tool()
 async def xlsx_export(
-    data: List[Dict[str, Any]],
+    data: List[Union[Dict[str, Any], List[Any]]],
     filename: str = "output",
     sheet_name: str = "Sheet1",
     description: str = None,
@@ -173,11 +339,13 @@ async def xlsx_export(
     """Export data to Excel (XLSX) format and save to filesystem.
     
     Args:
-        data: Array of objects representing spreadsheet rows
+        data: Array of objects representing spreadsheet rows, or array of
+            value arrays in column order (requires headers)
         filename: Filename for the exported file (without extension)
         sheet_name: Name of the worksheet/sheet within the Excel file
         description: Optional description of the file contents
-        headers: Optional custom column headers
+        headers: Optional custom column headers (required for array rows,
+            which must have one value per header)
         
     Returns:
         Dictionary with export results including path and file info
@@ -190,23 +358,29 @@ async def xlsx_export(
         if len(data) == 0:
             raise ValueError("Data array cannot be empty")
         
-        # Convert to XLSX
-        xlsx_content = convert_to_xlsx(data, sheet_name, headers)
+        # create_sheet would silently rename an empty title to "Sheet"
+        if not sheet_name:
+            raise ValueError("Sheet name must have at least one character")
         
-        # Generate UUID and filename
-        file_uuid = str(uuid.uuid4())
-        sanitized_filename = "".join(c if c.isalnum() or c in "_-" else "_" for c in filename)
-        full_filename = f"{sanitized_filename}_{file_uuid}.xlsx"
-        file_size = get_file_size_string(xlsx_content)
-        row_count = len(data)
-        column_count = len(data[0].keys()) if data else 0
+        positional = rows_are_positional(data, headers)
         
-        # Write XLSX to file system
-        filepath = await write_xlsx_to_file(xlsx_content, full_filename)
+        # Generate UUID and filename before building the workbook
+        full_filename = generate_export_filename(filename)
+        
+        # Convert to XLSX, writing straight to the file system
+        filepath, field_names = await export_to_file(
+            full_filename, convert_to_xlsx, data, sheet_name, headers, positional
+        )
+        
+        file_size = get_file_size_string(filepath.stat().st_size)
+        row_count = len(data)
+        column_count = len(field_names)
         
-        print(f"✅ XLSX generated: {full_filename} ({file_size})", file=sys.stderr)
-        print(f"   Rows: {row_count}, Columns: {column_count}, Sheet: {sheet_name}", file=sys.stderr)
-        print(f"   Saved to: {filepath}", file=sys.stderr)
+        sys.stderr.write(
+            f"✅ XLSX generated: {full_filename} ({file_size})\n"
+            f"   Rows: {row_count}, Columns: {column_count}, Sheet: {sheet_name}\n"
+            f"   Saved to: {filepath}\n"
+        )
         
         # Return simplified response with essential information
         return {
@@ -245,6 +419,10 @@ async def xlsx_export_multi_sheet(
             "headers": ["col1", "col2"] (optional)
         }
         
+        data may also be an array of value arrays, e.g. [["val1", "val2"], ...],
+        in which case headers are required and every row must have one value
+        per header.
+        
     Returns:
         Dictionary with export results including path and file info
     """
@@ -259,6 +437,7 @@ async def xlsx_export_multi_sheet(
         # Validate each sheet has required data
         total_rows = 0
         sheet_names = []
+        positional_flags = []
         for sheet in sheets:
             if not isinstance(sheet, dict):
                 raise ValueError("Each sheet must be an object with sheet_name and data")
@@ -269,27 +448,29 @@ async def xlsx_export_multi_sheet(
             if len(sheet['data']) == 0:
                 raise ValueError("Each sheet's data array cannot be empty")
             
+            positional_flags.append(rows_are_positional(sheet['data'], sheet.get('headers')))
+            
             sheet_name = sheet.get('sheet_name', 'Sheet1')
             sheet_names.append(sheet_name)
             total_rows += len(sheet['data'])
         
-        # Convert to multi-sheet XLSX
-        print(f"🔄 Generating multi-sheet Excel with {len(sheets)} sheets...", file=sys.stderr)
-        xlsx_content = convert_multi_sheets_to_xlsx(sheets)
+        # Generate UUID and filename before building the workbook
+        full_filename = generate_export_filename(filename)
         
-        # Generate UUID and filename
-        file_uuid = str(uuid.uuid4())
-        sanitized_filename = "".join(c if c.isalnum() or c in "_-" else "_" for c in filename)
-        full_filename = f"{sanitized_filename}_{file_uuid}.xlsx"
-        file_size = get_file_size_string(xlsx_content)
+        # Convert to multi-sheet XLSX, writing straight to the file system
+        print(f"🔄 Generating multi-sheet Excel with {len(sheets)} sheets...", file=sys.stderr)
+        filepath, _ = await export_to_file(
+            full_filename, convert_multi_sheets_to_xlsx, sheets, positional_flags
+        )
         
-        # Write XLSX to file system
-        filepath = await write_xlsx_to_file(xlsx_content, full_filename)
+        file_size = get_file_size_string(filepath.stat().st_size)
         
-        print(f"✅ Multi-sheet XLSX generated: {full_filename} ({file_size})", file=sys.stderr)
-        print(f"   Sheets: {len(sheets)} ({', '.join(sheet_names)})", file=sys.stderr)
-        print(f"   Total rows: {total_rows}", file=sys.stderr)
-        print(f"   Saved to: {filepath}", file=sys.stderr)
+        sys.stderr.write(
+            f"✅ Multi-sheet XLSX generated: {full_filename} ({file_size})\n"
+            f"   Sheets: {len(sheets)} ({', '.join(sheet_names)})\n"
+            f"   Total rows: {total_rows}\n"
+            f"   Saved to: {filepath}\n"
+        )
         
         # Return simplified response with essential information
         return {
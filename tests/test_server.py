@@ -0,0 +1,30 @@
+"""Tests for the XLSX export server."""
+
+import gc
+import sys
+
+import pytest
+
+pytest.importorskip("openpyxl")
+pytest.importorskip("mcp")
+
+from xlsx_export_mcp import server
+
+
+def test_multi_sheet_bad_value_is_reported_and_cleaned_up(tmp_path, monkeypatch):
+    """A bad value in a later sheet fails cleanly, without leaking files or stderr noise."""
+    unraisable = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+
+    filepath = tmp_path / "out.xlsx"
+    sheets = [
+        {"sheet_name": "A", "data": [{"a": 1}]},
+        {"sheet_name": "B", "data": [{"a": {"z": 1}}]},
+    ]
+
+    with pytest.raises(ValueError, match=r"Sheet 'B', row 2: Cannot convert"):
+        server.convert_multi_sheets_to_xlsx(filepath, sheets)
+    gc.collect()
+
+    assert not filepath.exists()
+    assert unraisable == []